@@ -1,13 +1,61 @@
 import sqlite3
-import random
 import datetime
+import functools
 import re
 import hashlib
+import hmac
 import os
+import queue
+import secrets
 import sys
+from contextlib import contextmanager
 
 # --- Constants ---
 DATABASE_FILE = "bank.db"
+READ_POOL_SIZE = 4 # Idle read-only connections kept open for reports and history
+ACCOUNT_CACHE_SIZE = 1024 # Recently used Account objects kept in memory
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+MOBILE_RE = re.compile(r'[0-9]{10}')
+PIN_RE = re.compile(r'[0-9]{4}')
+ACCOUNT_NO_RE = re.compile(r'[0-9]{10}')
+# scrypt cost for PIN hashing (~16 MiB, tens of ms per login)
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2**14, 8, 1
+
+# Hot-path statements, kept as single strings so sqlite3's statement cache reuses their compiled form
+SQL_UPDATE_BALANCE = "UPDATE accounts SET balance = ? WHERE account_number = ?"
+SQL_INSERT_TXN = """
+    INSERT INTO transactions (account_number, transaction_type, details, amount, current_balance, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+SQL_SELECT_HISTORY = """
+    SELECT timestamp, transaction_type, amount, current_balance, details
+    FROM transactions WHERE account_number = ? ORDER BY timestamp DESC
+"""
+
+# Table definitions; {table} lets a schema migration build a replacement alongside the original
+SQL_CREATE_ACCOUNTS = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        account_number INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        mail TEXT UNIQUE NOT NULL,
+        mobile_num TEXT UNIQUE NOT NULL,
+        address TEXT,
+        balance INTEGER NOT NULL,
+        pin_hash TEXT NOT NULL
+    )
+"""
+SQL_CREATE_TRANSACTIONS = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        account_number INTEGER NOT NULL,
+        transaction_type TEXT NOT NULL,
+        details TEXT,
+        amount INTEGER NOT NULL,
+        current_balance INTEGER NOT NULL,
+        timestamp TEXT NOT NULL,
+        FOREIGN KEY (account_number) REFERENCES accounts (account_number)
+    )
+"""
 
 # ----------------- Helper Functions ----------------- #
 
@@ -15,30 +63,46 @@ def clear_screen():
     """Clears the console screen."""
     os.system('cls' if os.name == 'nt' else 'clear')
 
-def log_transaction(cursor, acc_no, txn_type, amount, balance, details=""):
-    """Logs a transaction to the database."""
-    timestamp = datetime.datetime.now()
-    try:
-        cursor.execute("""
-            INSERT INTO transactions (account_number, transaction_type, details, amount, current_balance, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (acc_no, txn_type, details, amount, balance, timestamp))
-    except sqlite3.Error as e:
-        # This error is critical but shouldn't stop the main transaction from committing.
-        print(f"Warning: Failed to log transaction. {e}")
+def _scrypt(pin, salt, n, r, p):
+    return hashlib.scrypt(pin.encode(), salt=salt, n=n, r=r, p=p, dklen=32)
+
+def hash_pin(pin):
+    """Hashes a PIN with a random salt at the current cost. Stored as 'n$r$p$salt$hash'."""
+    salt = os.urandom(16)
+    key = _scrypt(pin, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${key.hex()}"
 
 # ----------------- Object-Oriented Core ----------------- #
 
 class Account:
     """Represents a single bank account, holding its data and operations."""
+    __slots__ = ('account_number', 'name', 'mail', 'mobile_num', 'address', 'balance', 'pin_hash',
+                 '_pin_params', '_pin_salt', '_pin_key')
+
     def __init__(self, account_number, name, mail, mobile_num, address, balance, pin_hash):
-        self.account_number = account_number
+        self.account_number = int(account_number)
         self.name = name
         self.mail = mail
         self.mobile_num = mobile_num
         self.address = address
         self.balance = int(balance)
+        self.set_pin_hash(pin_hash)
+
+    def set_pin_hash(self, pin_hash):
+        """Stores a PIN hash, decoding it once into the raw bytes authenticate() compares against."""
         self.pin_hash = pin_hash
+        parts = pin_hash.split("$")
+        try:
+            if len(parts) == 1:
+                # Legacy unsalted SHA-256 hex digest
+                self._pin_params, self._pin_salt, self._pin_key = None, None, bytes.fromhex(pin_hash)
+                return
+            n, r, p, salt, key = parts
+            self._pin_params = (int(n), int(r), int(p))
+            self._pin_salt, self._pin_key = bytes.fromhex(salt), bytes.fromhex(key)
+        except ValueError:
+            # Unreadable hash: keep the account loadable but let no PIN match it
+            self._pin_params, self._pin_salt, self._pin_key = None, None, None
 
     def deposit(self, amount):
         """Updates the balance in memory. Does NOT commit to DB."""
@@ -59,79 +123,159 @@ class Account:
         self.balance -= amount
         return True
 
+    def needs_pin_rehash(self):
+        """True if the PIN hash is legacy SHA-256 or was made with a different scrypt cost."""
+        return self._pin_params != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
     def authenticate(self, pin):
-        """Hashes the provided pin and compares it to the stored hash."""
-        hashed_pin = hashlib.sha256(pin.encode()).hexdigest()
-        return hashed_pin == self.pin_hash
+        """Hashes the provided pin with the stored salt and compares the raw digests in constant time."""
+        if self._pin_key is None:
+            return False
+        if self._pin_params is None:
+            return hmac.compare_digest(hashlib.sha256(pin.encode()).digest(), self._pin_key)
+        return hmac.compare_digest(_scrypt(pin, self._pin_salt, *self._pin_params), self._pin_key)
 
 class Bank:
     """Manages all accounts and database interactions."""
     def __init__(self, db_file):
         self.db_file = db_file
-        self.conn = sqlite3.connect(self.db_file)
+        # Autocommit mode: write paths open their own BEGIN IMMEDIATE ... COMMIT
+        self.conn = sqlite3.connect(self.db_file, isolation_level=None, cached_statements=256)
         self.conn.row_factory = sqlite3.Row # Allows accessing columns by name
         self.cursor = self.conn.cursor()
+        self._pending_logs = [] # Log rows queued by queue_log() for the open transaction
+        self._configure_connection()
+        self._migrate_schema()
         self._create_tables()
-        self.accounts = self._load_accounts()
+        # Accounts are read on demand; only the narrow uniqueness indexes are loaded up front
+        self._fetch_account = functools.lru_cache(maxsize=ACCOUNT_CACHE_SIZE)(self._read_account)
+        self._load_indexes()
+        # self.conn is the single writer; reads borrow from this pool so WAL lets them run alongside it
+        self._read_pool = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+
+    def _configure_connection(self):
+        """Applies WAL journaling and connection PRAGMAs so each commit costs a single WAL sync."""
+        try:
+            self.conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-65536;
+                PRAGMA foreign_keys=ON;
+            """)
+        except sqlite3.Error as e:
+            print(f"Database Error: Could not configure connection. {e}")
+            sys.exit(1)
+
+    def _migrate_schema(self):
+        """Rebuilds tables created with TEXT account numbers so accounts is keyed by the integer rowid."""
+        columns = {row['name']: row['type'] for row in self.cursor.execute("PRAGMA table_info(accounts)")}
+        if columns.get('account_number', '').upper() != 'TEXT':
+            return
+        try:
+            # Foreign keys stay off while the referenced table is swapped out
+            self.cursor.execute("PRAGMA foreign_keys=OFF")
+            with self.conn:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute(SQL_CREATE_ACCOUNTS.format(table="accounts_new"))
+                self.cursor.execute("""
+                    INSERT INTO accounts_new
+                    SELECT CAST(account_number AS INTEGER), name, mail, mobile_num, address, balance, pin_hash
+                    FROM accounts
+                """)
+                self.cursor.execute("DROP TABLE accounts")
+                self.cursor.execute("ALTER TABLE accounts_new RENAME TO accounts")
+                self.cursor.execute(SQL_CREATE_TRANSACTIONS.format(table="transactions_new"))
+                self.cursor.execute("""
+                    INSERT INTO transactions_new
+                    SELECT id, CAST(account_number AS INTEGER), transaction_type, details, amount, current_balance, timestamp
+                    FROM transactions
+                """)
+                # DROP TABLE discards the AUTOINCREMENT counter; carry it over so ids of deleted rows aren't reissued
+                row = self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+                self.cursor.execute("DROP TABLE transactions")
+                self.cursor.execute("ALTER TABLE transactions_new RENAME TO transactions")
+                if row:
+                    self.cursor.execute(
+                        "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'transactions'", (row['seq'],)
+                    )
+                    if self.cursor.rowcount == 0:
+                        self.cursor.execute(
+                            "INSERT INTO sqlite_sequence (name, seq) VALUES ('transactions', ?)", (row['seq'],)
+                        )
+        except sqlite3.Error as e:
+            print(f"Database Error: Could not migrate account numbers to INTEGER. {e}")
+            sys.exit(1)
+        finally:
+            self.cursor.execute("PRAGMA foreign_keys=ON")
 
     def _create_tables(self):
         """Creates the database tables if they don't exist."""
         try:
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS accounts (
-                    account_number TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    mail TEXT UNIQUE NOT NULL,
-                    mobile_num TEXT UNIQUE NOT NULL,
-                    address TEXT,
-                    balance INTEGER NOT NULL,
-                    pin_hash TEXT NOT NULL
-                )
-            ''')
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    account_number TEXT NOT NULL,
-                    transaction_type TEXT NOT NULL,
-                    details TEXT,
-                    amount INTEGER NOT NULL,
-                    current_balance INTEGER NOT NULL,
-                    timestamp TEXT NOT NULL,
-                    FOREIGN KEY (account_number) REFERENCES accounts (account_number)
-                )
-            ''')
-            self.conn.commit()
+            self.cursor.execute(SQL_CREATE_ACCOUNTS.format(table="accounts"))
+            self.cursor.execute(SQL_CREATE_TRANSACTIONS.format(table="transactions"))
+            # Serves history's WHERE and ORDER BY together
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_txn_acc_time ON transactions (account_number, timestamp DESC)"
+            )
         except sqlite3.Error as e:
             print(f"Database Error: Could not create tables. {e}")
             sys.exit(1)
 
-    def _load_accounts(self):
-        """Loads all accounts from the database into a dictionary of Account objects."""
-        accounts = {}
+    def _load_indexes(self):
+        """Loads the account numbers, emails and mobiles in use, so lookups and uniqueness checks skip the DB."""
+        self._account_numbers = set()
+        self._mail_index = {}
+        self._mobile_index = {}
         try:
-            self.cursor.execute("SELECT * FROM accounts")
-            rows = self.cursor.fetchall()
-            for row in rows:
-                acc = Account(**dict(row))
-                accounts[acc.account_number] = acc
+            loader = self.conn.cursor()
+            loader.row_factory = None
+            loader.execute("SELECT account_number, mail, mobile_num FROM accounts")
+            for account_number, mail, mobile_num in loader:
+                self._account_numbers.add(account_number)
+                self._mail_index[mail] = account_number
+                self._mobile_index[mobile_num] = account_number
         except sqlite3.Error as e:
             print(f"Database Error: Could not load accounts. {e}")
             sys.exit(1)
-        return accounts
+
+    def _read_account(self, account_number):
+        """Builds an Account from its database row. Called through the _fetch_account LRU cache."""
+        # Plain tuple in Account.__init__ order, as in _load_indexes; no sqlite3.Row per lookup
+        loader = self.conn.cursor()
+        loader.row_factory = None
+        row = loader.execute("""
+            SELECT account_number, name, mail, mobile_num, address, balance, pin_hash
+            FROM accounts WHERE account_number = ?
+        """, (account_number,)).fetchone()
+        return Account(*row) if row else None
     
     def _commit_change(self, query, params=()):
         """Executes a query and commits it. Generic helper for single operations."""
         try:
-            self.cursor.execute(query, params)
-            self.conn.commit()
+            with self.conn:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute(query, params)
             return True
         except sqlite3.Error as e:
             print(f"Database Error: {e}")
-            self.conn.rollback()
             return False
 
+    def queue_log(self, acc_no, txn_type, amount, balance, details=""):
+        """Queues a transaction log row; written by the next _flush_logs()."""
+        self._pending_logs.append((acc_no, txn_type, details, amount, balance))
+
+    def _flush_logs(self):
+        """Writes every queued log row inside the current transaction; a failure aborts the transaction."""
+        # Formatted here rather than by sqlite3's implicit (deprecated) datetime adapter
+        timestamp = datetime.datetime.now().isoformat(sep=" ", timespec="microseconds")
+        try:
+            self.cursor.executemany(SQL_INSERT_TXN, [row + (timestamp,) for row in self._pending_logs])
+        finally:
+            self._pending_logs.clear()
+
     def _insert_account(self, account):
-        """Inserts a new account object into the database."""
+        """Inserts a new account object and its opening log entry in a single commit."""
         query = """
             INSERT INTO accounts (account_number, name, mail, mobile_num, address, balance, pin_hash)
             VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -140,15 +284,87 @@ class Bank:
             account.account_number, account.name, account.mail,
             account.mobile_num, account.address, account.balance, account.pin_hash
         )
-        return self._commit_change(query, params)
+        try:
+            with self.conn:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute(query, params)
+                self.queue_log(account.account_number, "Account Created", account.balance, account.balance)
+                self._flush_logs()
+            return True
+        except sqlite3.Error as e:
+            print(f"Database Error: {e}")
+            return False
     
     def _delete_account_record(self, account_number):
-        """Deletes an account and its transactions from the database."""
-        self._commit_change("DELETE FROM transactions WHERE account_number = ?", (account_number,))
-        return self._commit_change("DELETE FROM accounts WHERE account_number = ?", (account_number,))
+        """Deletes an account and its transactions from the database in a single transaction."""
+        try:
+            with self.conn:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute("DELETE FROM transactions WHERE account_number = ?", (account_number,))
+                self.cursor.execute("DELETE FROM accounts WHERE account_number = ?", (account_number,))
+            return True
+        except sqlite3.Error as e:
+            print(f"Database Error: {e}")
+            return False
+
+    def upgrade_pin_hash(self, account, pin):
+        """Re-hashes an outdated PIN hash at the current scrypt cost once the user has logged in with it."""
+        if not account.needs_pin_rehash():
+            return
+        pin_hash = hash_pin(pin)
+        query = "UPDATE accounts SET pin_hash = ? WHERE account_number = ?"
+        if self._commit_change(query, (pin_hash, account.account_number)):
+            account.set_pin_hash(pin_hash)
+
+    def _generate_account_number(self):
+        """Draws random 10-digit account numbers until one is not already in use."""
+        while True:
+            account_number = 1000000000 + secrets.randbelow(9000000000)
+            if account_number not in self._account_numbers:
+                return account_number
+
+    def _open_read_conn(self):
+        conn = sqlite3.connect(self.db_file, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextmanager
+    def read_conn(self):
+        """Lends a read-only connection from the pool, opening one if none is idle."""
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            conn = self._open_read_conn()
+        try:
+            yield conn
+        finally:
+            try:
+                self._read_pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """Closes the pooled read connections and then the writer."""
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self.conn.close()
 
     def find_account(self, acc_no):
-        return self.accounts.get(acc_no)
+        """Looks up an account from the number as typed by the user."""
+        if not ACCOUNT_NO_RE.fullmatch(acc_no):
+            return None
+        account_number = int(acc_no)
+        if account_number not in self._account_numbers:
+            return None
+        try:
+            return self._fetch_account(account_number)
+        except sqlite3.Error as e:
+            print(f"Database Error: {e}")
+            return None
 
     def create_account(self):
         # ... (User input gathering is the same as the OOP version) ...
@@ -157,22 +373,22 @@ class Bank:
         name = input("Enter your name: ")
         while True:
             mail = input("Enter your email-id: ")
-            if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', mail):
+            if not EMAIL_RE.match(mail):
                 print("❌ Invalid email format.")
-            elif any(acc.mail == mail for acc in self.accounts.values()):
+            elif mail in self._mail_index:
                 print("❌ This email is already registered.")
             else: break
         while True:
             mobile_num = input("Enter your 10-digit mobile number: ")
-            if not (mobile_num.isdigit() and len(mobile_num) == 10):
+            if not MOBILE_RE.fullmatch(mobile_num):
                 print("❌ Invalid mobile number. Must be 10 digits.")
-            elif any(acc.mobile_num == mobile_num for acc in self.accounts.values()):
+            elif mobile_num in self._mobile_index:
                 print("❌ This mobile number is already registered.")
             else: break
         while True:
             pin = input("Create a 4-digit PIN for your account: ")
-            if pin.isdigit() and len(pin) == 4:
-                pin_hash = hashlib.sha256(pin.encode()).hexdigest()
+            if PIN_RE.fullmatch(pin):
+                pin_hash = hash_pin(pin)
                 break
             else: print("❌ PIN must be exactly 4 digits.")
         address = input("Enter your address: ")
@@ -182,14 +398,14 @@ class Bank:
                 if balance >= 0: break
                 else: print("❌ Initial deposit cannot be negative.")
             except ValueError: print("❌ Invalid amount.")
-        account_number = str(random.randint(1000000000, 9999999999))
+        account_number = self._generate_account_number()
         
         new_account = Account(account_number, name, mail, mobile_num, address, balance, pin_hash)
         
         if self._insert_account(new_account):
-            self.accounts[account_number] = new_account
-            log_transaction(self.cursor, account_number, "Account Created", balance, balance)
-            self.conn.commit()
+            self._account_numbers.add(account_number)
+            self._mail_index[new_account.mail] = account_number
+            self._mobile_index[new_account.mobile_num] = account_number
             print(f"\n✅ Account created successfully! Your Account Number is {account_number}")
         else:
             print("❌ Failed to create account in database.")
@@ -201,17 +417,21 @@ class Bank:
             return
 
         if self._delete_account_record(account.account_number):
-            del self.accounts[account.account_number]
+            self._account_numbers.discard(account.account_number)
+            self._mail_index.pop(account.mail, None)
+            self._mobile_index.pop(account.mobile_num, None)
+            # lru_cache has no per-key eviction; clear it so a reissued number can't return this account
+            self._fetch_account.cache_clear()
             print(f"✅ Account {account.account_number} closed permanently.")
         else:
             print("❌ Error closing account.")
             
     def transfer_money(self, source_account):
         dest_acc_no = input("Enter the destination account number: ").strip()
-        if dest_acc_no == source_account.account_number:
+        dest_account = self.find_account(dest_acc_no)
+        if dest_account and dest_account.account_number == source_account.account_number:
             print("❌ You cannot transfer money to your own account.")
             return
-        dest_account = self.find_account(dest_acc_no)
         if not dest_account:
             print("❌ Destination account not found.")
             return
@@ -227,41 +447,80 @@ class Bank:
             print("❌ Invalid amount entered.")
             return
 
-        # --- Atomic Transaction Starts Here ---
+        if self.apply_transfer(source_account, dest_account, amount):
+            print(f"✅ Successfully transferred {amount} to account {dest_account.account_number}.")
+
+    def apply_deposit(self, account, amount):
+        """Deposits into an account, saving the new balance and its log entry in one transaction."""
+        if not account.deposit(amount):
+            return False
+        if not self._save_balance(account, "Deposit", amount):
+            account.balance -= amount # Rollback in-memory
+            return False
+        return True
+
+    def apply_withdrawal(self, account, amount):
+        """Withdraws from an account, saving the new balance and its log entry in one transaction."""
+        if not account.withdraw(amount):
+            return False
+        if not self._save_balance(account, "Withdrawal", amount):
+            account.balance += amount # Rollback in-memory
+            return False
+        return True
+
+    def _save_balance(self, account, txn_type, amount):
+        """Writes an account's in-memory balance and logs the change under a single commit."""
         try:
-            # 1. Update balances in memory first for logging
-            source_account.balance -= amount
-            dest_account.balance += amount
-            
-            # 2. Execute both updates in the database
-            self.cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", (source_account.balance, source_account.account_number))
-            self.cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", (dest_account.balance, dest_account.account_number))
-            
-            # 3. Log both transactions
-            log_transaction(self.cursor, source_account.account_number, "Transfer Out", amount, source_account.balance, f"To: {dest_acc_no}")
-            log_transaction(self.cursor, dest_acc_no, "Transfer In", amount, dest_account.balance, f"From: {source_account.account_number}")
-            
-            # 4. Commit ONLY after all operations succeed
-            self.conn.commit()
-            print(f"✅ Successfully transferred {amount} to account {dest_acc_no}.")
+            with self.conn:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute(SQL_UPDATE_BALANCE, (account.balance, account.account_number))
+                self.queue_log(account.account_number, txn_type, amount, account.balance)
+                self._flush_logs()
+            return True
+        except sqlite3.Error as e:
+            print(f"Database Error: {e}")
+            return False
 
+    def apply_transfer(self, source_account, dest_account, amount):
+        """Moves funds between two accounts. Both balances and both log entries commit together or not at all."""
+        # Update balances in memory first for logging
+        source_account.balance -= amount
+        dest_account.balance += amount
+        try:
+            with self.conn:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.executemany(SQL_UPDATE_BALANCE, [
+                    (source_account.balance, source_account.account_number),
+                    (dest_account.balance, dest_account.account_number),
+                ])
+                self.queue_log(source_account.account_number, "Transfer Out", amount, source_account.balance, f"To: {dest_account.account_number}")
+                self.queue_log(dest_account.account_number, "Transfer In", amount, dest_account.balance, f"From: {source_account.account_number}")
+                self._flush_logs()
+            return True
         except sqlite3.Error as e:
-            # 5. If any step fails, roll everything back
-            self.conn.rollback()
-            source_account.balance += amount # Revert in-memory changes too
+            # The with-block rolled the database back; revert in-memory changes too
+            source_account.balance += amount
             dest_account.balance -= amount
             print(f"❌ Transaction failed and has been rolled back: {e}")
+            return False
 
     def branch_manager_report(self):
         # ... (This function remains largely the same) ...
         clear_screen()
         print("\n🏦 Branch Manager Report")
         print("-----------------------")
-        if not self.accounts:
+        try:
+            with self.read_conn() as conn:
+                total_accounts, total_balance = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(balance), 0) FROM accounts"
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Could not generate report: {e}")
+            return
+        if not total_accounts:
             print("No accounts in the bank yet.")
             return
-        print(f"Total Accounts: {len(self.accounts)}")
-        total_balance = sum(acc.balance for acc in self.accounts.values())
+        print(f"Total Accounts: {total_accounts}")
         print(f"Total Balance in Bank: {total_balance}")
         print("-----------------------")
         
@@ -291,6 +550,7 @@ def main():
             else:
                 pin = input("Enter your 4-digit PIN: ")
                 if account.authenticate(pin):
+                    the_bank.upgrade_pin_hash(account, pin)
                     # --- Logged-in User Menu ---
                     while True:
                         clear_screen()
@@ -308,27 +568,15 @@ def main():
                         if user_choice == "1":
                             try:
                                 amount = int(input("Enter amount to deposit: "))
-                                if account.deposit(amount):
-                                    query = "UPDATE accounts SET balance = ? WHERE account_number = ?"
-                                    if the_bank._commit_change(query, (account.balance, account.account_number)):
-                                        log_transaction(the_bank.cursor, account.account_number, "Deposit", amount, account.balance)
-                                        the_bank.conn.commit()
-                                        print(f"✅ Deposit successful. New Balance: {account.balance}")
-                                    else:
-                                        account.balance -= amount # Rollback in-memory
+                                if the_bank.apply_deposit(account, amount):
+                                    print(f"✅ Deposit successful. New Balance: {account.balance}")
                             except ValueError:
                                 print("❌ Invalid amount.")
                         elif user_choice == "2":
                             try:
                                 amount = int(input("Enter amount to withdraw: "))
-                                if account.withdraw(amount):
-                                    query = "UPDATE accounts SET balance = ? WHERE account_number = ?"
-                                    if the_bank._commit_change(query, (account.balance, account.account_number)):
-                                        log_transaction(the_bank.cursor, account.account_number, "Withdrawal", amount, account.balance)
-                                        the_bank.conn.commit()
-                                        print(f"✅ Withdrawal successful. New Balance: {account.balance}")
-                                    else:
-                                        account.balance += amount # Rollback in-memory
+                                if the_bank.apply_withdrawal(account, amount):
+                                    print(f"✅ Withdrawal successful. New Balance: {account.balance}")
                             except ValueError:
                                 print("❌ Invalid amount.")
                         elif user_choice == "3":
@@ -336,7 +584,11 @@ def main():
                         elif user_choice == "4":
                             print(f"💰 Current Balance: {account.balance}")
                         elif user_choice == "5":
-                            display_transaction_history(the_bank.cursor, account.account_number)
+                            try:
+                                with the_bank.read_conn() as conn:
+                                    display_transaction_history(conn.cursor(), account.account_number)
+                            except sqlite3.Error as e:
+                                print(f"Could not retrieve transaction history: {e}")
                         elif user_choice == "6":
                             the_bank.close_account(account)
                             break
@@ -351,7 +603,7 @@ def main():
         elif main_choice == "3":
             the_bank.branch_manager_report()
         elif main_choice == "4":
-            the_bank.conn.close()
+            the_bank.close()
             print("👋 Thank you for using the Banking System!")
             break
         else:
@@ -362,20 +614,16 @@ def main():
 def display_transaction_history(cursor, acc_no):
     print("\n📜 Transaction History:")
     try:
-        cursor.execute(
-            "SELECT * FROM transactions WHERE account_number = ? ORDER BY timestamp DESC",
-            (acc_no,)
-        )
-        transactions = cursor.fetchall()
-        if not transactions:
-            print("  No transactions found for this account.")
-            return
-
-        for row in transactions:
+        # Iterate the cursor directly so rows print as they are read instead of after fetchall()
+        found = False
+        for row in cursor.execute(SQL_SELECT_HISTORY, (acc_no,)):
+            found = True
             print(f"  - Time: {row['timestamp']}")
             print(f"    Type: {row['transaction_type']}, Amount: {row['amount']}, Balance: {row['current_balance']}")
             if row['details']:
                 print(f"    Details: {row['details']}")
+        if not found:
+            print("  No transactions found for this account.")
     except sqlite3.Error as e:
         print(f"Could not retrieve transaction history: {e}")
 